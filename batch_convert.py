@@ -0,0 +1,289 @@
+"""
+Sketch-to-Code AI - Toplu Dönüştürme
+====================================
+Klasördeki veya glob desenine uyan wireframe çizimlerini arayüz olmadan
+HTML'e dönüştürür.
+
+Görseller tek tek okunur, sınırlı sayıda işçiyle işlenir ve her sonuç
+çıktı klasöründeki manifest.jsonl dosyasına hemen yazılır. Yarıda kalan
+bir çalışma aynı komutla yeniden başlatıldığında biten sayfalar atlanır.
+
+Kullanım:
+    python batch_convert.py sketches/ -o out/
+    python batch_convert.py "arsiv/**/*.jpg" -o out/ --workers 8 --zip
+    python batch_convert.py sketches/ -o out/ --offline --framework "Bootstrap 5"
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from cli_support import import_app, quiet_streamlit_bare_mode
+
+app = import_app()
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def _walk_files(directory):
+    for root, dirs, files in os.walk(directory):
+        # Alt klasörler de alfabetik sırayla gezilir
+        dirs.sort()
+        for name in sorted(files):
+            yield os.path.join(root, name)
+
+
+def iter_sketch_paths(sources):
+    """
+    Klasörlerdeki (alt klasörler dahil) ve glob desenlerine uyan görselleri sırayla üretir.
+    """
+    seen = set()
+    for source in sources:
+        if os.path.isdir(source):
+            paths = _walk_files(source)
+        else:
+            paths = iter(sorted(glob.iglob(source, recursive=True)))
+
+        for path in paths:
+            if path.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                yield path
+
+
+class Manifest:
+    """
+    Sadece eklenen JSONL ilerleme kaydı.
+
+    Her satır bir sayfanın sonucudur; satır yazılıp diske aktarıldıktan sonra
+    sayfa bitmiş sayılır. Aynı anahtar için son satır geçerlidir.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        truncated = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    truncated = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Yazılırken kesilen son satır
+                        continue
+                    self.entries[entry['key']] = entry
+        self._file = open(path, "a", encoding="utf-8")
+        if truncated:
+            # Yeni kayıt kesik satırın devamına yazılmasın
+            self._file.write("\n")
+
+    def is_done(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and entry['status'] == 'done'
+
+    def append(self, entry):
+        self.entries[entry['key']] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def options_digest(options, offline=False):
+    """
+    Seçeneklerin kısa, kararlı özeti; seçenekler değişirse sayfalar yeniden üretilir.
+    """
+    data = json.dumps({**options, 'offline': offline}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def convert_sketch(path, data, options, output_dir, api_key=None, offline=False, zip_export=False):
+    """
+    Tek bir çizimi HTML'e dönüştürüp çıktı klasörüne yazar.
+
+    Returns:
+        dict: Manifest satırı ('status': 'done' veya 'error')
+    """
+    started = time.perf_counter()
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{os.path.splitext(os.path.basename(path))[0]}-{digest[:8]}"
+    entry = {'source': path, 'sha256': digest, 'name': name}
+
+    try:
+        image = app.decode_image(data)
+        colors = app.extract_color_palette(image)
+        _, processed = app.preprocess_image(image)
+        page_options = {**options, 'extracted_colors': colors}
+
+        if offline:
+            code = app.generate_offline_html(page_options, app.extract_layout(processed))
+        else:
+            result = app.generate_code_with_options(processed, api_key, page_options)
+            if not result or result.startswith("❌"):
+                raise RuntimeError(result or "❌ Hata: Boş yanıt")
+            code = app.clean_generated_code(result)
+
+        html_path = os.path.join(output_dir, f"{name}.html")
+        _write_atomic(html_path, code.encode("utf-8"))
+        entry['output'] = html_path
+
+        if zip_export:
+            zip_path = os.path.join(output_dir, f"{name}.zip")
+            shutil.copyfile(app.create_zip_export(code, name), f"{zip_path}.tmp")
+            os.replace(f"{zip_path}.tmp", zip_path)
+            entry['zip'] = zip_path
+
+        entry['status'] = 'done'
+    except Exception as e:
+        entry['status'] = 'error'
+        entry['error'] = str(e)
+
+    entry['ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return entry
+
+
+def convert_sketches(sources, output_dir, options, api_key=None, workers=app.BATCH_MAX_WORKERS,
+                     offline=False, zip_export=False):
+    """
+    Çizimleri akış halinde dönüştürür; her sonucu bittiği sırayla üretir.
+
+    Aynı anda en fazla 2 * workers görsel bellekte tutulur. Manifest'te
+    bitmiş görünen sayfalar okunur ama yeniden üretilmez ('skipped').
+    Hız sınırı ve tekrar denemeler app.RequestScheduler tarafından uygulanır.
+
+    Args:
+        sources: Klasör veya glob desenleri
+        output_dir: HTML/ZIP çıktılarının ve manifest.jsonl'in yazılacağı klasör
+        options: dict - Uygulamadaki kullanıcı seçenekleriyle aynı anahtarlar
+        api_key: Google API Key (offline ise gerekmez)
+        workers: Eşzamanlı işlenen çizim sayısı
+        offline: True ise model yerine şablon tabanlı taslak üretilir
+        zip_export: True ise her sayfa için ZIP de yazılır
+
+    Yields:
+        dict: Manifest satırı ('status': 'done', 'error' veya 'skipped')
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    suffix = options_digest(options, offline)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    # future -> manifest anahtarı
+    pending = {}
+
+    def collect(futures):
+        for future in futures:
+            entry = {'key': pending.pop(future), **future.result()}
+            entry['finished'] = datetime.now().isoformat(timespec='seconds')
+            manifest.append(entry)
+            yield entry
+
+    try:
+        for path in iter_sketch_paths(sources):
+            with open(path, "rb") as f:
+                data = f.read()
+            key = f"{hashlib.sha256(data).hexdigest()}:{suffix}"
+            if manifest.is_done(key):
+                yield {**manifest.entries[key], 'status': 'skipped'}
+                continue
+
+            # Geri basınç: işçiler yetişemezse yeni görsel okunmaz
+            while len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+
+            future = executor.submit(
+                convert_sketch, path, data, options, output_dir, api_key, offline, zip_export
+            )
+            pending[future] = key
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        manifest.close()
+
+
+def main():
+    # Komut satırında Streamlit'in bare mode uyarıları çıktıyı kirletmesin
+    quiet_streamlit_bare_mode()
+
+    parser = argparse.ArgumentParser(description="Sketch-to-Code AI toplu dönüştürme")
+    parser.add_argument("sources", nargs="+", help="Görsel klasörleri veya glob desenleri")
+    parser.add_argument("-o", "--output", required=True, help="Çıktı klasörü (manifest.jsonl burada tutulur)")
+    parser.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY"),
+                        help="Google API Key (varsayılan: GOOGLE_API_KEY)")
+    parser.add_argument("--offline", action="store_true", help="Model yerine şablon tabanlı taslak üret")
+    parser.add_argument("--zip", action="store_true", help="Her sayfa için ZIP export da yaz")
+    parser.add_argument("--workers", type=int, default=app.BATCH_MAX_WORKERS,
+                        help="Eşzamanlı işlenen çizim sayısı")
+    parser.add_argument("--framework", default="Tailwind CSS", choices=list(app.OFFLINE_FRAMEWORKS))
+    parser.add_argument("--color-scheme", default="Modern Mavi-Beyaz",
+                        choices=[*app.OFFLINE_COLOR_SCHEMES, "Çıkarılan Renkleri Kullan"])
+    parser.add_argument("--design-style", default="Modern Minimal", choices=list(app.OFFLINE_DESIGN_STYLES))
+    parser.add_argument("--layout-mode", default=app.LAYOUT_MODE, choices=list(app.LAYOUT_MODES))
+    parser.add_argument("--no-responsive", action="store_true", help="Responsive tasarım isteme")
+    parser.add_argument("--animations", action="store_true", help="Animasyon ekle")
+    parser.add_argument("--seo", action="store_true", help="SEO etiketleri ekle")
+    parser.add_argument("--accessibility", action="store_true", help="Erişilebilirlik özellikleri ekle")
+    parser.add_argument("--custom-prompt", default="", help="Ek istekler")
+    args = parser.parse_args()
+
+    if not args.offline and not args.api_key:
+        parser.error("--api-key (veya GOOGLE_API_KEY) gerekli; API'siz taslak için --offline kullanın")
+
+    options = {
+        'framework': args.framework,
+        'color_scheme': args.color_scheme,
+        'design_style': args.design_style,
+        'responsive': not args.no_responsive,
+        'animations': args.animations,
+        'custom_prompt': args.custom_prompt,
+        'add_seo': args.seo,
+        'add_accessibility': args.accessibility,
+        'use_extracted_colors': args.color_scheme == "Çıkarılan Renkleri Kullan",
+        'layout_mode': args.layout_mode,
+    }
+
+    started = time.perf_counter()
+    counts = {'done': 0, 'skipped': 0, 'error': 0}
+    icons = {'done': "✅", 'skipped': "⏭️", 'error': "❌"}
+    try:
+        for entry in convert_sketches(
+            args.sources, args.output, options, args.api_key, args.workers, args.offline, args.zip
+        ):
+            counts[entry['status']] += 1
+            detail = entry.get('error') or entry.get('output', "")
+            print(f"[{sum(counts.values())}] {icons[entry['status']]} {entry['source']} -> {detail}",
+                  file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        print("⏹️ Durduruldu; aynı komutla kaldığı yerden devam edebilirsiniz.", file=sys.stderr)
+
+    print(json.dumps({
+        **counts,
+        'elapsed_s': round(time.perf_counter() - started, 1),
+        'manifest': os.path.join(args.output, MANIFEST_NAME),
+    }, ensure_ascii=False))
+    sys.exit(1 if counts['error'] else 0)
+
+
+if __name__ == "__main__":
+    main()
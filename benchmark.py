@@ -0,0 +1,499 @@
+"""
+Sketch-to-Code AI - Offline Benchmark
+=====================================
+CV pipeline'ını ve kod üretim yolunu API anahtarı olmadan ölçer.
+
+Sentetik wireframe çizimleri (VGA'dan 12 MP'ye) üretilir, Gemini modeli
+ayarlanabilir gecikmeli yerel bir sahte modelle değiştirilir ve her aşama
+için p50/p95 gecikme, throughput ve tepe bellek JSON olarak raporlanır.
+
+Kullanım:
+    python benchmark.py
+    python benchmark.py --sizes vga,12mp --iterations 10 --latency 0.8
+    python benchmark.py --stages palette,preprocess --output bench.json
+"""
+
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from cli_support import import_app, quiet_streamlit_bare_mode
+
+app = import_app()
+
+
+# Çözünürlük adı -> (genişlik, yükseklik)
+SIZES = {
+    'vga': (640, 480),
+    'hd': (1280, 720),
+    'fhd': (1920, 1080),
+    '12mp': (4000, 3000),
+}
+
+STAGES = ['import', 'decode', 'upload', 'palette', 'preprocess', 'layout', 'model_input',
+          'zip_export', 'generate', 'versions']
+
+# zip_export aşamasında arşive eklenen sayfa sayısı
+BATCH_PAGES = 4
+
+# import aşaması: app modülünün soğuk yüklenme bütçesi (ms) ve modül
+# yüklenirken içe aktarılmaması gereken ağır paketler
+IMPORT_BUDGET_MS = 1000
+LAZY_MODULES = ['cv2', 'google.generativeai', 'google.ai.generativelanguage', 'sklearn']
+
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# upload aşaması: tepe RSS ölçümü için alt süreçte çalışan betik. Kütüphaneler
+# ve iş parçacığı havuzları önce küçük bir görselle ısıtılır.
+UPLOAD_RSS_SCRIPT = """
+import sys
+import benchmark
+with open(sys.argv[1], 'rb') as f:
+    data = f.read()
+legacy = sys.argv[2] == '1'
+benchmark.upload_runner(benchmark.make_sketch(*benchmark.SIZES['vga']), legacy)()
+before = benchmark.peak_rss_bytes()
+benchmark.upload_runner(data, legacy)()
+print(benchmark.peak_rss_bytes() - before)
+"""
+
+
+class FakeResponse:
+    """
+    generate_content yanıtının yerel karşılığı.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    genai.GenerativeModel yerine kullanılan, ayarlanabilir gecikmeli sahte model.
+    """
+
+    latency = 0.5
+    chunks = 10
+    html = (
+        "<!DOCTYPE html><html><head><style>" + "section { padding: 2rem; }\n" * 50 + "</style></head><body>"
+        + "<section><h2>Başlık</h2><p>İçerik</p></section>" * 50
+        + "<script>document.body.classList.add('ready');</script></body></html>"
+    )
+
+    def __init__(self, model_name=None, generation_config=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if stream:
+            return self._stream()
+        time.sleep(self.latency)
+        return FakeResponse(self.html)
+
+    def _stream(self):
+        size = max(1, len(self.html) // self.chunks)
+        for start in range(0, len(self.html), size):
+            time.sleep(self.latency / self.chunks)
+            yield FakeResponse(self.html[start:start + size])
+
+
+def make_sketch(width, height, seed=0):
+    """
+    Telefon fotoğrafına benzeyen sentetik bir wireframe çizimi üretir (JPEG bayt).
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 235, dtype=np.uint8)
+    line = max(2, width // 400)
+
+    # Header, nav, hero (başlık, metin satırları, düğme), kartlar ve footer kutuları
+    cv2.rectangle(img, (width // 20, height // 20), (width * 19 // 20, height // 8), (40, 40, 40), line)
+    for i in range(4):
+        x = width // 2 + i * width // 10
+        cv2.line(img, (x, height // 12), (x + width // 14, height // 12), (60, 60, 60), line)
+    cv2.rectangle(img, (width // 20, height // 6), (width * 19 // 20, height // 2), (30, 30, 90), line)
+    cv2.line(img, (width // 10, height // 4), (width // 2, height // 4), (40, 40, 40), line * 2)
+    for j in range(2):
+        y = height * (6 + j) // 20
+        cv2.line(img, (width // 10, y), (width * 4 // 10, y), (60, 60, 60), line)
+    cv2.rectangle(img, (width // 10, height * 17 // 40), (width // 5, height * 19 // 40), (40, 40, 40), line)
+    for i in range(3):
+        x0 = width // 20 + i * width * 3 // 10
+        cv2.rectangle(img, (x0, height * 11 // 20), (x0 + width // 4, height * 8 // 10), (40, 40, 40), line)
+        for j in range(2):
+            y = height * (27 + 2 * j) // 40
+            cv2.line(img, (x0 + width // 40, y), (x0 + width // 5, y), (60, 60, 60), line)
+    cv2.rectangle(img, (width // 20, height * 17 // 20), (width * 19 // 20, height * 19 // 20), (40, 40, 40), line)
+
+    # Kağıt dokusu ve ışık farkı
+    noise = rng.normal(0, 6, img.shape)
+    gradient = np.linspace(-15, 10, width)[None, :, None]
+    img = np.clip(img + noise + gradient, 0, 255).astype(np.uint8)
+
+    buffer = BytesIO()
+    Image.fromarray(img).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def measure(func, iterations, warmup=1):
+    """
+    Bir fonksiyonu tekrar tekrar çalıştırır ve gecikme/bellek istatistiklerini döndürür.
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    tracemalloc.start()
+    for _ in range(iterations):
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings_ms = np.array(timings) * 1000
+    total = sum(timings)
+    return {
+        'iterations': iterations,
+        'p50_ms': round(float(np.percentile(timings_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings_ms, 95)), 3),
+        'mean_ms': round(float(timings_ms.mean()), 3),
+        'throughput_per_s': round(iterations / total, 3) if total else None,
+        # Yalnızca tracemalloc'un gördüğü (Python/NumPy) tahsisler; PIL'in iç tamponları dahil değil
+        'peak_memory_mb': round(peak / (1024 * 1024), 3),
+    }
+
+
+def measure_import_time(iterations):
+    """
+    app modülünün soğuk import süresini `python -X importtime` ile ölçer.
+
+    Her tur yeni bir süreçte çalışır. En yavaş üst düzey modüller ve
+    yüklenmemesi gerekirken yüklenen ağır paketler (LAZY_MODULES) raporlanır.
+    """
+    app_dir = os.path.dirname(os.path.abspath(app.__file__))
+    totals = []
+    modules = {}
+    for _ in range(iterations):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app"],
+            cwd=app_dir, capture_output=True, text=True, check=True
+        )
+        modules = {}
+        for line in proc.stderr.splitlines():
+            match = IMPORT_TIME_PATTERN.match(line)
+            if match:
+                # Girinti derinliği: 1 boşluk = app'in kendisi, 3 = app'in doğrudan import'ları
+                modules[match.group(4)] = (int(match.group(2)) / 1000, len(match.group(3)))
+        totals.append(modules['app'][0])
+
+    totals.sort()
+    direct = sorted(
+        ((name, ms) for name, (ms, depth) in modules.items() if depth == 3),
+        key=lambda item: item[1], reverse=True
+    )
+    return {
+        'iterations': iterations,
+        'p50_ms': round(totals[len(totals) // 2], 3),
+        'max_ms': round(totals[-1], 3),
+        'budget_ms': IMPORT_BUDGET_MS,
+        'slowest_imports_ms': {name: round(ms, 3) for name, ms in direct[:8]},
+        'eager_heavy_modules': [name for name in LAZY_MODULES if name in modules],
+    }
+
+
+def peak_rss_bytes():
+    """
+    Sürecin tepe RSS değerini bayt olarak döndürür.
+
+    Linux'ta ru_maxrss exec sonrasında üst sürecin tepe değerini taşıdığından
+    yalnızca bu sürecin adres alanına ait VmHWM okunur.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss Linux'ta KB, macOS'ta bayt
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def upload_runner(data, legacy=False):
+    """
+    Önbelleksiz tek bir yüklemeyi (çözme, palet, ön işleme, model girdisi ve yerleşim)
+    çalıştıran fonksiyonu döndürür. legacy=True ise eski PIL yolu kullanılır.
+    """
+    upload_cache = app.get_upload_cache()
+
+    def analyze():
+        upload_cache.clear()
+        app.analyze_upload(data)
+
+    def analyze_pil():
+        # Eski yol: PIL çözme, palet ve ön işleme için ayrı dizi kopyaları
+        pil_image = Image.open(BytesIO(data))
+        pil_image.load()
+        app.extract_color_palette(pil_image)
+        _, pil_processed = app.preprocess_image(np.array(pil_image))
+        app.prepare_model_input(pil_processed)
+        app.extract_layout(pil_processed)
+
+    return analyze_pil if legacy else analyze
+
+
+def measure_upload_rss(data, legacy=False):
+    """
+    Tek bir yüklemenin tepe RSS artışını bayt olarak ölçer.
+
+    tracemalloc OpenCV/PIL'in C tarafındaki tamponlarını görmediğinden ölçüm
+    yeni bir süreçte, çalışmadan önceki ve sonraki ru_maxrss farkıyla yapılır.
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    fd, path = tempfile.mkstemp(suffix=".img")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        proc = subprocess.run(
+            [sys.executable, "-c", UPLOAD_RSS_SCRIPT, path, "1" if legacy else "0"],
+            cwd=app_dir, capture_output=True, text=True, check=True
+        )
+    finally:
+        os.remove(path)
+    return int(proc.stdout.split()[-1])
+
+
+def measure_upload(data, iterations, legacy=False):
+    """
+    Önbelleksiz tek bir yüklemeyi ölçer (bkz. upload_runner).
+
+    peak_frames, ayrı süreçte ölçülen tepe RSS artışının (OpenCV/PIL tamponları
+    dahil) tam çözünürlüklü RGB kare boyutuna oranıdır. shares_decoded_buffer,
+    aşamaların çözülen tamponu kopyalamadan kullanıp kullanmadığını gösterir.
+    """
+    image = app.decode_image(data)
+    stats = measure(upload_runner(data, legacy), iterations)
+    peak_rss = measure_upload_rss(data, legacy)
+    stats['peak_rss_mb'] = round(peak_rss / (1024 * 1024), 3)
+    stats['peak_frames'] = round(peak_rss / image.nbytes, 2)
+    if not legacy:
+        stats['shares_decoded_buffer'] = bool(np.shares_memory(app.preprocess_image(image)[0], image))
+    app.get_upload_cache().clear()
+    return stats
+
+
+def measure_pipeline(func, iterations):
+    """
+    measure() sonucuna PreprocessPipeline aşamalarının ortalama sürelerini ekler.
+    """
+    timings = {}
+    stats = measure(lambda: func(timings), iterations)
+    # measure bir ısınma turu da çalıştırır
+    stats['stages_ms'] = {stage: round(ms / (iterations + 1), 3) for stage, ms in timings.items()}
+    return stats
+
+
+def run_benchmarks(sizes, stages, iterations, latency, palette_backends, threshold_modes):
+    """
+    Seçilen aşamaları her çözünürlük için ölçer.
+
+    Returns:
+        dict: JSON olarak yazılacak rapor
+    """
+    FakeGenerativeModel.latency = latency
+    app.load_genai().GenerativeModel = FakeGenerativeModel
+    # Sahte modelde hız sınırı yok; ölçülen süreye kuyruk beklemesi karışmasın
+    app.SCHEDULER_REQUESTS_PER_MINUTE = 60_000
+    app.SCHEDULER_BURST = 1_000
+    cache = app.get_result_cache()
+
+    options = {
+        'framework': "Tailwind CSS",
+        'color_scheme': "Modern Mavi-Beyaz",
+        'design_style': "Modern Minimal",
+        'responsive': True,
+        'animations': False,
+        'custom_prompt': "",
+        'add_seo': True,
+        'add_accessibility': True,
+        'use_extracted_colors': False,
+    }
+
+    report = {
+        'config': {
+            'iterations': iterations,
+            'fake_latency_s': latency,
+            'model_input_encoding': app.MODEL_INPUT_ENCODING,
+            'model_input_max_edge': app.MODEL_INPUT_MAX_EDGE,
+            'preprocess_max_edge': app.PREPROCESS_MAX_EDGE,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'cpu_count': os.cpu_count(),
+        },
+        'results': {},
+    }
+
+    if 'import' in stages:
+        report['import'] = measure_import_time(iterations)
+
+    for size_name in sizes:
+        width, height = SIZES[size_name]
+        data = make_sketch(width, height)
+        image = app.decode_image(data)
+        _, processed = app.preprocess_image(image)
+        results = {'input_bytes': len(data)}
+
+        if 'decode' in stages:
+            results['decode'] = measure(lambda: app.decode_image(data), iterations)
+            results['decode[pil]'] = measure(
+                lambda: np.asarray(Image.open(BytesIO(data)).convert('RGB')), iterations
+            )
+
+        if 'upload' in stages:
+            results['upload'] = measure_upload(data, iterations)
+            results['upload[pil]'] = measure_upload(data, iterations, legacy=True)
+
+        if 'palette' in stages:
+            for backend in palette_backends:
+                stats = measure(lambda: app.extract_color_palette(image, backend=backend), iterations)
+                stats['inertia'] = round(
+                    app.extract_color_palette_detailed(image, backend=backend)['inertia'], 1
+                )
+                results[f'palette[{backend}]'] = stats
+
+        if 'preprocess' in stages:
+            for mode in threshold_modes:
+                pipeline = app.PreprocessPipeline(mode=mode)
+                results[f'preprocess[{mode}]'] = measure_pipeline(
+                    lambda timings: pipeline.process(image, timings), iterations
+                )
+            # Opsiyonel aşamalar varsayılan mod üzerinde ayrıca ölçülür
+            pipeline = app.PreprocessPipeline(denoise=True, deskew=True)
+            results['preprocess[+denoise+deskew]'] = measure_pipeline(
+                lambda timings: pipeline.process(image, timings), iterations
+            )
+            # Eski davranış: tam çözünürlük, RGB -> BGR -> GRAY
+            results['preprocess[full_res]'] = measure_pipeline(
+                lambda timings: app.PreprocessPipeline(max_edge=0, block_size=11).process(image, timings),
+                iterations
+            )
+        
+        if 'layout' in stages:
+            stats = measure(lambda: app.extract_layout(processed), iterations)
+            layout = app.extract_layout(processed)
+            stats['nodes'] = app.layout_summary(layout)
+            stats['bytes_sent'] = len(app.layout_signature(layout).encode("utf-8"))
+            results['layout'] = stats
+        
+        if 'model_input' in stages:
+            stats = measure(lambda: app.prepare_model_input(processed), iterations)
+            stats['bytes_sent'] = app.prepare_model_input(processed)['bytes']
+            results['model_input'] = stats
+
+        if 'zip_export' in stages:
+            pages = {n: FakeGenerativeModel.html for n in range(1, BATCH_PAGES + 1)}
+            results['zip_export'] = measure(
+                lambda: app.create_zip_export(FakeGenerativeModel.html, "bench", pages, use_cache=False),
+                iterations
+            )
+            results['zip_export[cached]'] = measure(
+                lambda: app.create_zip_export(FakeGenerativeModel.html, "bench", pages), iterations
+            )
+
+        # Üretim aşamalarında önbellek her turda temizlenir; aksi halde yalnızca ilk tur ölçülür
+        if 'generate' in stages:
+            def generate():
+                cache.clear()
+                app.generate_code_with_options(processed, "benchmark-key", options)
+            results['generate'] = measure(generate, iterations, warmup=0)
+
+        if 'versions' in stages:
+            tasks = [
+                (style, processed, {**options, 'design_style': style})
+                for style in app.VERSION_STYLES
+            ]
+
+            def sequential():
+                cache.clear()
+                for _, task_image, task_options in tasks:
+                    app.generate_code_with_options(task_image, "benchmark-key", task_options)
+
+            def concurrent():
+                cache.clear()
+                app.generate_code_concurrently(tasks, "benchmark-key")
+
+            results['versions[sequential]'] = measure(sequential, iterations, warmup=0)
+            results['versions[concurrent]'] = measure(concurrent, iterations, warmup=0)
+
+        report['results'][size_name] = results
+
+    # Süreç genelindeki tepe RSS (Linux'ta KB)
+    report['config']['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def main():
+    # Komut satırında Streamlit'in bare mode uyarıları çıktıyı kirletmesin
+    quiet_streamlit_bare_mode()
+
+    parser = argparse.ArgumentParser(description="Sketch-to-Code AI offline benchmark")
+    parser.add_argument("--sizes", default="vga,hd,fhd,12mp",
+                        help=f"Virgülle ayrılmış çözünürlükler ({', '.join(SIZES)})")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Virgülle ayrılmış aşamalar ({', '.join(STAGES)})")
+    parser.add_argument("--palette-backends", default=",".join(app.available_palette_backends()),
+                        help="Karşılaştırılacak palet motorları")
+    parser.add_argument("--threshold-modes", default=",".join(app.PreprocessPipeline.MODES),
+                        help="Karşılaştırılacak eşikleme modları")
+    parser.add_argument("--iterations", type=int, default=5, help="Aşama başına tekrar sayısı")
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Sahte modelin çağrı başına gecikmesi (saniye)")
+    parser.add_argument("--output", help="JSON raporun yazılacağı dosya (varsayılan: stdout)")
+    parser.add_argument("--check-import", action="store_true",
+                        help="import süresi bütçeyi aşarsa veya ağır paketler erken yüklenirse hata koduyla çık")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES] + [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"Bilinmeyen değer: {', '.join(unknown)}")
+
+    report = run_benchmarks(
+        sizes, stages, args.iterations, args.latency,
+        [b.strip() for b in args.palette_backends.split(",") if b.strip()],
+        [m.strip() for m in args.threshold_modes.split(",") if m.strip()]
+    )
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.check_import and 'import' in report:
+        result = report['import']
+        if result['p50_ms'] > result['budget_ms'] or result['eager_heavy_modules']:
+            sys.exit(
+                f"import bütçesi aşıldı: {result['p50_ms']} ms (bütçe {result['budget_ms']} ms), "
+                f"erken yüklenen: {', '.join(result['eager_heavy_modules']) or '-'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
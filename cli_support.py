@@ -0,0 +1,50 @@
+"""
+Sketch-to-Code AI - Komut Satırı Yardımcıları
+=============================================
+benchmark.py ve batch_convert.py, app modülünü `streamlit run` olmadan
+(bare mode) kullanır. Bu modül iki betiğin ortak ihtiyacı olan sessiz
+import ve bare mode log filtresini sağlar.
+"""
+
+import logging
+
+# Streamlit'in sunucu olmadan çalışırken bastığı zararsız uyarılar
+BARE_MODE_MESSAGES = (
+    "missing ScriptRunContext",
+    "No runtime found",
+    "Session state does not function",
+)
+
+
+class BareModeFilter(logging.Filter):
+    """Yalnızca Streamlit'in bare mode uyarılarını eler."""
+
+    def filter(self, record):
+        message = record.getMessage()
+        return not any(text in message for text in BARE_MODE_MESSAGES)
+
+
+_bare_mode_filter = BareModeFilter()
+
+
+def quiet_streamlit_bare_mode():
+    """Tanımlı streamlit.* logger'larına bare mode filtresini ekler.
+
+    Streamlit her modül için üst logger'a iletmeyen ayrı bir logger açtığından
+    filtre tek tek eklenir. Diğer log kayıtları ve Python uyarıları etkilenmez.
+    """
+    for name, logger in list(logging.root.manager.loggerDict.items()):
+        if name != "streamlit" and not name.startswith("streamlit."):
+            continue
+        if isinstance(logger, logging.Logger) and _bare_mode_filter not in logger.filters:
+            logger.addFilter(_bare_mode_filter)
+
+
+def import_app():
+    """app modülünü bare mode uyarıları basılmadan import eder."""
+    # Logger'lar streamlit import edilirken oluşur; filtre app'ten önce eklenmeli
+    import streamlit  # noqa: F401
+    quiet_streamlit_bare_mode()
+    import app
+    quiet_streamlit_bare_mode()
+    return app
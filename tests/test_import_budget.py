@@ -0,0 +1,15 @@
+"""
+app modülünün soğuk import bütçesi (bkz. benchmark.py --check-import).
+"""
+
+import benchmark
+
+
+def test_heavy_modules_load_lazily():
+    result = benchmark.measure_import_time(1)
+    assert result['eager_heavy_modules'] == []
+
+
+def test_cold_import_within_budget():
+    result = benchmark.measure_import_time(3)
+    assert result['p50_ms'] <= result['budget_ms'], result['slowest_imports_ms']
@@ -0,0 +1,44 @@
+"""
+Yükleme yolunun tek çözülmüş tampon üzerinde çalıştığını doğrular (bkz. benchmark.py upload aşaması).
+"""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app
+import benchmark
+
+# Tepe RSS artışı / tam çözünürlüklü RGB kare (OpenCV/PIL tamponları dahil);
+# 12 MP'de yeni yol ~1.8, eski PIL yolu ~2.9
+MAX_PEAK_FRAMES = 2.25
+
+
+@pytest.fixture(scope="module")
+def upload():
+    width, height = benchmark.SIZES['12mp']
+    return benchmark.make_sketch(width, height)
+
+
+def test_decode_returns_rgb(upload):
+    image = app.decode_image(upload)
+    reference = np.asarray(Image.open(BytesIO(upload)).convert('RGB'))
+    assert image.dtype == np.uint8
+    assert image.shape == reference.shape
+    assert np.abs(image.astype(np.int16) - reference).mean() < 1
+
+
+def test_stages_share_decoded_buffer(upload):
+    image = app.decode_image(upload)
+    original, _ = app.preprocess_image(image)
+    assert np.shares_memory(original, image)
+
+
+def test_upload_peak_memory(upload):
+    stats = benchmark.measure_upload(upload, 1)
+    legacy = benchmark.measure_upload(upload, 1, legacy=True)
+    assert stats['shares_decoded_buffer']
+    assert stats['peak_frames'] <= MAX_PEAK_FRAMES, stats
+    assert stats['peak_frames'] < legacy['peak_frames'], (stats, legacy)